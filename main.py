@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+import os
+import tempfile
+
 import numpy as np
 from PyQt5 import QtGui, QtWidgets
 
@@ -11,15 +14,43 @@ import shgyield.shg as shg
 ## Functions to help ingest and pre-process your data
 ################################################################################
 
+def loadcached(infile):
+    ''' np.loadtxt, keeping a binary .npy copy that is refreshed when the file changes '''
+    cache = infile + '.npy'
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(infile):
+        try:
+            return np.load(cache)
+        except (OSError, ValueError, EOFError):
+            pass # damaged copy, parse the text file and rewrite it
+    data = np.loadtxt(infile)
+    tmp = None
+    try:
+        # write next to the target and swap it in, so an interrupted run never leaves a partial copy
+        handle, tmp = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(cache) or '.')
+        with os.fdopen(handle, 'wb') as out:
+            np.save(out, data)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask) # mkstemp is owner-only, use the usual file mode
+        os.replace(tmp, cache)
+    except OSError:
+        pass # read-only location, parse the text file every time
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+    return data
+
 def loadeps(infile, scale):
     ''' loads chi1 from file, converts to epsilon '''
-    energy, real, imag = np.loadtxt(infile, unpack=True)
-    return {'energy': energy, 'data': 1 + (4 * np.pi * ((real + 1j*imag) * scale))}
+    data = loadcached(infile)
+    chi1 = np.ascontiguousarray(data[:, 1:3]).view(np.complex128).ravel() # (re, im) columns read as complex
+    return {'energy': data[:, 0], 'data': 1 + (4 * np.pi * (chi1 * scale))}
 
 def loadshg(infile, scale):
     ''' loads chi2 from file, scales and converts to appropriate units '''
-    energy, re1w, im1w, re2w, im2w = np.loadtxt(infile, unpack=True)
-    return {'energy': energy, 'data': scale * ((re1w + re2w) + 1j*(im1w + im2w))}
+    data = loadcached(infile)
+    chi2 = (data[:, 1:3] + data[:, 3:5]).view(np.complex128).ravel() # (re, im) of 1w + 2w read as complex
+    return {'energy': data[:, 0], 'data': scale * chi2}
 
 
 ################################################################################
@@ -78,7 +109,7 @@ MATERIAL['Si(111)']['medium 2']['chi2']['zxy'] = 0
 ## Data: Experiment
 ################################################################################
 
-exp_e, exp_rpp, exp_rsp, exp_rps = np.loadtxt('example/reference/experiment.dat', unpack=True)
+exp_e, exp_rpp, exp_rsp, exp_rps = loadcached('example/reference/experiment.dat').T
 
 EXP = {
     'Si(111)': {
@@ -136,6 +167,9 @@ if __name__ == '__main__':
 #                      sigma_chi = INIT['broad']['chi'],
 #                      sigma_out = INIT['broad']['out'])
 
+# shg.savenpz('spect.npz', SPECT)
+
+# or, if plain text is needed for other tools:
 # np.savetxt('spect.dat',
 #            np.column_stack((SPECT['energy'], SPECT['pp'], SPECT['sp'], SPECT['ps'], SPECT['ss'])),
 #            fmt = '%07.4f  %.8e  %.8e  %.8e  %.8e',
@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 import pyqtgraph as pg
 
@@ -30,6 +32,11 @@ class CustomWidget(QtWidgets.QWidget):
 
         self.colors = ['k', '#e41a1c', '#377eb8', '#4daf4a', '#984ea3', '#ff7f00', '#ffff33', '#a65628', '#f781bf']
 
+        # brushes and pens shared by all plot items, built once
+        self._brushes = [pg.mkBrush(color=c) for c in self.colors]
+        self._symbol_pen = pg.mkPen('k', width=0.5)
+        self._grid_pen = pg.mkPen(color=0.8, width=0.5, style=QtCore.Qt.DashLine)
+
         self.marker = {
             'pen': None,
             'symbolSize': 12,
@@ -77,6 +84,12 @@ class CustomWidget(QtWidgets.QWidget):
             }
         }
 
+        # polar angles shared by every polar plot, with cos/sin cached for trans_polar
+        self._phi_full = np.arange(0, 361)
+        self._phi_full.setflags(write=False)
+        self._phi_cos = np.cos(np.radians(self._phi_full))
+        self._phi_sin = np.sin(np.radians(self._phi_full))
+
         # initializes legends, polar lines
         for pol in ['pp', 'sp', 'ps', 'ss']:
             self.widgets['tab_polar'][pol].addLegend()
@@ -85,13 +98,13 @@ class CustomWidget(QtWidgets.QWidget):
             self.widgets['tab_' + pol]['thr_spect'].addLegend()
             self.widgets['tab_' + pol]['exp_polar'].addLegend()
             self.widgets['tab_' + pol]['exp_spect'].addLegend()
-            for ang in np.arange(0, 361, 30):
+            for ang in self._phi_full[::30]:
                 self.widgets['tab_polar'][pol].addItem(
-                    pg.InfiniteLine(angle = ang, pen = pg.mkPen(color=0.8, width=0.5, style=QtCore.Qt.DashLine)))
+                    pg.InfiniteLine(angle = ang, pen = self._grid_pen))
                 self.widgets['tab_' + pol]['thr_polar'].addItem(
-                    pg.InfiniteLine(angle = ang, pen = pg.mkPen(color=0.8, width=0.5, style=QtCore.Qt.DashLine)))
+                    pg.InfiniteLine(angle = ang, pen = self._grid_pen))
                 self.widgets['tab_' + pol]['exp_polar'].addItem(
-                    pg.InfiniteLine(angle = ang, pen = pg.mkPen(color=0.8, width=0.5, style=QtCore.Qt.DashLine)))
+                    pg.InfiniteLine(angle = ang, pen = self._grid_pen))
 
         # calculation time!
 
@@ -160,8 +173,8 @@ class CustomWidget(QtWidgets.QWidget):
                             pen = None,
                             symbol = deco,
                             symbolSize = 5,
-                            symbolBrush = pg.mkBrush(color=self.colors[deco]),
-                            symbolPen = pg.mkPen('k', width=0.5),
+                            symbolBrush = self._brushes[deco],
+                            symbolPen = self._symbol_pen,
                             name = case)
                     elif kind == 'spect':
                         if 'stdev' in data.keys():
@@ -176,8 +189,8 @@ class CustomWidget(QtWidgets.QWidget):
                             pen = None,
                             symbol = deco,
                             symbolSize = 5,
-                            symbolBrush = pg.mkBrush(color=self.colors[deco]),
-                            symbolPen = pg.mkPen('k', width=0.5),
+                            symbolBrush = self._brushes[deco],
+                            symbolPen = self._symbol_pen,
                             name = case)
             deco += 1
 
@@ -186,48 +199,33 @@ class CustomWidget(QtWidgets.QWidget):
 
         deco = 0
         self.test = {}
+        self.polar_yield = functools.lru_cache(maxsize=64)(self.calc_polar)
+        self.spect_yield = functools.lru_cache(maxsize=64)(self.calc_spect)
         for case in self.material.keys():
-            self.polar = shg.shgyield(energy =    self.ui.box_energy_polar.value(),
-                                      eps_m1 =    self.material[case]['medium 1']['eps'],
-                                      # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
-                                      eps_m2 =    self.material[case]['medium 2']['eps'],
-                                      eps_m3 =    self.material[case]['medium 3']['eps'],
-                                      # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
-                                      chi2 =      self.material[case]['medium 2']['chi2'],
-                                      theta =     self.ui.sld_angle_theta.value(),
-                                      phi =       np.arange(0, 361),
-                                      gamma =     self.ui.sld_angle_gamma.value(),
-                                      thick =     self.material[case]['lslab']*5.2918E-2,
-                                      sigma_eps = self.ui.sld_broad_eps.value(),
-                                      sigma_chi = self.ui.sld_broad_chi.value(),
-                                      sigma_out = 0)
-
-            self.spect = shg.shgyield(energy =    self.erng,
-                                      eps_m1 =    self.material[case]['medium 1']['eps'],
-                                      # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
-                                      eps_m2 =    self.material[case]['medium 2']['eps'],
-                                      eps_m3 =    self.material[case]['medium 3']['eps'],
-                                      # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
-                                      chi2 =      self.material[case]['medium 2']['chi2'],
-                                      theta =     self.ui.sld_angle_theta.value(),
-                                      phi =       self.ui.sld_angle_phi.value(),
-                                      gamma =     self.ui.sld_angle_gamma.value(),
-                                      thick =     self.material[case]['lslab']*5.2918E-2,
-                                      sigma_eps = self.ui.sld_broad_eps.value(),
-                                      sigma_chi = self.ui.sld_broad_chi.value(),
-                                      sigma_out = self.ui.sld_broad_out.value())
-
-            self.pidx = np.where(np.isclose(self.spect['phi'], self.polar['phi']))
-            self.eidx = np.where(np.isclose(self.spect['energy'], self.polar['energy']))
+            self.polar = self.polar_yield(case,
+                                          self.ui.box_energy_polar.value(),
+                                          self.ui.sld_angle_theta.value(),
+                                          self.ui.sld_angle_gamma.value(),
+                                          self.ui.sld_broad_eps.value(),
+                                          self.ui.sld_broad_chi.value())
+            self.spect = self.spect_yield(case,
+                                          self.ui.sld_angle_theta.value(),
+                                          self.ui.sld_angle_phi.value(),
+                                          self.ui.sld_angle_gamma.value(),
+                                          self.ui.sld_broad_eps.value(),
+                                          self.ui.sld_broad_chi.value(),
+                                          self.ui.sld_broad_out.value())
+
+            self.pidx = np.searchsorted(self.polar['phi'], self.spect['phi'])
 
             self.test[case] = {
                 pol: {
                     'test1': self.widgets['tab_polar'][pol].plot(self.trans_polar(self.polar['phi'], self.polar[pol]*self.scale), pen=pg.mkPen(color=self.colors[deco], width=1.5), name=case),
-                    'test2': self.widgets['tab_polar'][pol].plot(self.trans_polar2(self.spect['phi'], self.polar[pol][self.pidx][0]*self.scale), **self.marker),
+                    'test2': self.widgets['tab_polar'][pol].plot(self.trans_polar2(self.spect['phi'], self.polar[pol][self.pidx]*self.scale), **self.marker),
                     'test3': self.widgets['tab_spect'][pol].plot(x=self.spect['energy'], y=self.spect[pol]*self.scale, pen=pg.mkPen(color=self.colors[deco], width=1.5), name=case),
                     'test4': self.widgets['tab_spect'][pol].addLine(x=self.polar['energy'], pen=pg.mkPen(color=(204,0,0,150), width=2)),
                     'test5': self.widgets['tab_' + pol]['thr_polar'].plot(self.trans_polar(self.polar['phi'], self.polar[pol]*self.scale), pen=pg.mkPen(color=self.colors[deco], width=1.5), name=case),
-                    'test6': self.widgets['tab_' + pol]['thr_polar'].plot(self.trans_polar2(self.spect['phi'], self.polar[pol][self.pidx][0]*self.scale), **self.marker),
+                    'test6': self.widgets['tab_' + pol]['thr_polar'].plot(self.trans_polar2(self.spect['phi'], self.polar[pol][self.pidx]*self.scale), **self.marker),
                     'test7': self.widgets['tab_' + pol]['thr_spect'].plot(x = self.spect['energy'], y = self.spect[pol]*self.scale, pen=pg.mkPen(color=self.colors[deco], width=1.5), name=case),
                     'test8': self.widgets['tab_' + pol]['thr_spect'].addLine(x = self.polar['energy'], pen = pg.mkPen(color=(204,0,0,150), width=2))
                 } for pol in ['pp', 'sp', 'ps', 'ss']
@@ -254,18 +252,28 @@ class CustomWidget(QtWidgets.QWidget):
             self.widgets['tab_' + pol]['exp_polar'].setAspectLocked(True)
             self.widgets['tab_' + pol]['exp_polar'].disableAutoRange()
 
-        # updating
-        self.ui.box_energy_polar.valueChanged.connect(self.update_plot)
-        # self.ui.box_energy_spect_min.valueChanged.connect(self.update_plot)
-        # self.ui.box_energy_spect_max.valueChanged.connect(self.update_plot)
-        
-        self.ui.sld_angle_theta.valueChanged.connect(self.update_plot)
-        self.ui.sld_angle_phi.valueChanged.connect(self.update_plot)
-        self.ui.sld_angle_gamma.valueChanged.connect(self.update_plot)
-        
-        self.ui.sld_broad_eps.valueChanged.connect(self.update_plot)
-        self.ui.sld_broad_chi.valueChanged.connect(self.update_plot)
-        self.ui.sld_broad_out.valueChanged.connect(self.update_plot)
+        # updating, debounced so that typing or stepping only recalculates once it settles
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(50)
+        self.timer.timeout.connect(self.update_plot)
+
+        # spin boxes only emit once the user finishes typing
+        self.ui.box_energy_polar.setKeyboardTracking(False)
+        for box in [self.ui.box_angle_theta, self.ui.box_angle_phi, self.ui.box_angle_gamma,
+                    self.ui.box_broad_eps, self.ui.box_broad_chi, self.ui.box_broad_out]:
+            box.setKeyboardTracking(False)
+
+        self.ui.box_energy_polar.valueChanged.connect(self.timer.start)
+        # self.ui.box_energy_spect_min.valueChanged.connect(self.timer.start)
+        # self.ui.box_energy_spect_max.valueChanged.connect(self.timer.start)
+
+        # while dragging, valueChanged only updates the spin boxes; the plot follows on release
+        self.sliders = [self.ui.sld_angle_theta, self.ui.sld_angle_phi, self.ui.sld_angle_gamma,
+                        self.ui.sld_broad_eps, self.ui.sld_broad_chi, self.ui.sld_broad_out]
+        for sld in self.sliders:
+            sld.valueChanged.connect(self.queue_update)
+            sld.sliderReleased.connect(self.timer.start)
 
         # simple demonstration of pure Qt widgets interacting with pyqtgraph
         # self.ui.checkBox.stateChanged.connect(self.toggleMouse)
@@ -277,54 +285,84 @@ class CustomWidget(QtWidgets.QWidget):
     #         enabled = False
 
     #     self.ui.plotWidget.setMouseEnabled(x=enabled, y=enabled)
+    def queue_update(self):
+        ''' schedules update_plot, unless a slider is still being dragged '''
+        if not any(sld.isSliderDown() for sld in self.sliders):
+            self.timer.start()
+
     def trans_polar(self, angle, radius):
+        if angle is self._phi_full:
+            return {'x': radius*self._phi_cos, 'y': radius*self._phi_sin}
         return {'x': radius*np.cos(np.radians(angle)), 'y': radius*np.sin(np.radians(angle))}
 
     def trans_polar2(self, angle, radius):
+        if angle == int(angle) and 0 <= angle <= 360:
+            return {'x': [radius*self._phi_cos[int(angle)]], 'y': [radius*self._phi_sin[int(angle)]]}
         return {'x': [radius*np.cos(np.radians(angle))], 'y': [radius*np.sin(np.radians(angle))]}
 
+    def calc_polar(self, case, energy, theta, gamma, sigma_eps, sigma_chi):
+        ''' polar SHG yield at a single energy; wrapped in an LRU cache as polar_yield '''
+        return shg.shgyield(energy =    energy,
+                            eps_m1 =    self.material[case]['medium 1']['eps'],
+                            # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
+                            eps_m2 =    self.material[case]['medium 2']['eps'],
+                            eps_m3 =    self.material[case]['medium 3']['eps'],
+                            # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
+                            chi2 =      self.material[case]['medium 2']['chi2'],
+                            theta =     theta,
+                            phi =       self._phi_full,
+                            gamma =     gamma,
+                            thick =     self.material[case]['lslab']*5.2918E-2,
+                            sigma_eps = sigma_eps,
+                            sigma_chi = sigma_chi,
+                            sigma_out = 0)
+
+    def calc_spect(self, case, theta, phi, gamma, sigma_eps, sigma_chi, sigma_out):
+        ''' SHG yield spectrum at a single phi; wrapped in an LRU cache as spect_yield '''
+        return shg.shgyield(energy =    self.erng,
+                            eps_m1 =    self.material[case]['medium 1']['eps'],
+                            # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
+                            eps_m2 =    self.material[case]['medium 2']['eps'],
+                            eps_m3 =    self.material[case]['medium 3']['eps'],
+                            # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
+                            chi2 =      self.material[case]['medium 2']['chi2'],
+                            theta =     theta,
+                            phi =       phi,
+                            gamma =     gamma,
+                            thick =     self.material[case]['lslab']*5.2918E-2,
+                            sigma_eps = sigma_eps,
+                            sigma_chi = sigma_chi,
+                            sigma_out = sigma_out)
+
     def update_plot(self):
         for case in self.material.keys():
-            polar = shg.shgyield(energy =    self.ui.box_energy_polar.value(),
-                                 eps_m1 =    self.material[case]['medium 1']['eps'],
-                                 # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
-                                 eps_m2 =    self.material[case]['medium 2']['eps'],
-                                 eps_m3 =    self.material[case]['medium 3']['eps'],
-                                 # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
-                                 chi2 =      self.material[case]['medium 2']['chi2'],
-                                 theta =     self.ui.sld_angle_theta.value(),
-                                 phi =       np.arange(0, 361),
-                                 gamma =     self.ui.sld_angle_gamma.value(),
-                                 thick =     self.material[case]['lslab']*5.2918E-2,
-                                 sigma_eps = self.ui.sld_broad_eps.value(),
-                                 sigma_chi = self.ui.sld_broad_chi.value(),
-                                 sigma_out = 0)
-
-            spect = shg.shgyield(energy =    self.erng,
-                                 eps_m1 =    self.material[case]['medium 1']['eps'],
-                                 # eps_m2 =    self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['eps'],
-                                 eps_m2 =    self.material[case]['medium 2']['eps'],
-                                 eps_m3 =    self.material[case]['medium 3']['eps'],
-                                 # chi2 =      self.material[case]['medium 2']['{:4.2f}'.format(self.gapgui['box_gap_' + case].value())]['chi2'],
-                                 chi2 =      self.material[case]['medium 2']['chi2'],
-                                 theta =     self.ui.sld_angle_theta.value(),
-                                 phi =       self.ui.sld_angle_phi.value(),
-                                 gamma =     self.ui.sld_angle_gamma.value(),
-                                 thick =     self.material[case]['lslab']*5.2918E-2,
-                                 sigma_eps = self.ui.sld_broad_eps.value(),
-                                 sigma_chi = self.ui.sld_broad_chi.value(),
-                                 sigma_out = self.ui.sld_broad_out.value())
-
-            pidx = np.where(np.isclose(spect['phi'], polar['phi']))
-            eidx = np.where(np.isclose(spect['energy'], polar['energy']))
+            polar = self.polar_yield(case,
+                                     self.ui.box_energy_polar.value(),
+                                     self.ui.sld_angle_theta.value(),
+                                     self.ui.sld_angle_gamma.value(),
+                                     self.ui.sld_broad_eps.value(),
+                                     self.ui.sld_broad_chi.value())
+            spect = self.spect_yield(case,
+                                     self.ui.sld_angle_theta.value(),
+                                     self.ui.sld_angle_phi.value(),
+                                     self.ui.sld_angle_gamma.value(),
+                                     self.ui.sld_broad_eps.value(),
+                                     self.ui.sld_broad_chi.value(),
+                                     self.ui.sld_broad_out.value())
+
+            pidx = np.searchsorted(polar['phi'], spect['phi'])
 
             for pol in ['pp', 'sp', 'ps', 'ss']:
-
-                self.test[case][pol]['test1'].setData(self.trans_polar(polar['phi'], polar[pol]*self.scale)),
-                self.test[case][pol]['test2'].setData(self.trans_polar2(spect['phi'], polar[pol][pidx][0]*self.scale)),
-                self.test[case][pol]['test3'].setData(x = spect['energy'], y = spect[pol]*self.scale),
-                self.test[case][pol]['test4'].setValue(polar['energy']),
-                self.test[case][pol]['test5'].setData(self.trans_polar(polar['phi'], polar[pol]*self.scale)),
-                self.test[case][pol]['test6'].setData(self.trans_polar2(spect['phi'], polar[pol][pidx][0]*self.scale)),
-                self.test[case][pol]['test7'].setData(x = spect['energy'], y = spect[pol]*self.scale),
+                # the individual tabs show the same curves as the overview, so share the arrays
+                curve = self.trans_polar(polar['phi'], polar[pol]*self.scale)
+                point = self.trans_polar2(spect['phi'], polar[pol][pidx]*self.scale)
+                yspect = spect[pol]*self.scale
+
+                self.test[case][pol]['test1'].setData(curve)
+                self.test[case][pol]['test2'].setData(point)
+                self.test[case][pol]['test3'].setData(x = spect['energy'], y = yspect)
+                self.test[case][pol]['test4'].setValue(polar['energy'])
+                self.test[case][pol]['test5'].setData(curve)
+                self.test[case][pol]['test6'].setData(point)
+                self.test[case][pol]['test7'].setData(x = spect['energy'], y = yspect)
                 self.test[case][pol]['test8'].setValue(polar['energy'])
@@ -9,19 +9,25 @@ todo:
 * Allow for saving all data and parameters to NetCDF file, and final data to txt
 * Develop SHG functions into class
 * Improve rotation function and avoid running unless changed
-* Improve spline function and avoid running unless changed
 * Convert to absolute broadening to avoid trouble with polar plots
 
 * Develop GUI to ingest and pre-process data, provide initial values, etc.
 * Include every symmetry group (see Popov) into menus
 """
 
+import collections
+
 import numpy as np
 from scipy import constants, ndimage
-from scipy.interpolate import InterpolatedUnivariateSpline
+from scipy.interpolate import InterpolatedUnivariateSpline, make_interp_spline
 
 np.seterr(divide='ignore', invalid='ignore', over='ignore') # ignores overflow and divide-by-zero
 
+HC = constants.value("Planck constant in eV s") * constants.c # in eV m
+HBAR = constants.value("Planck constant over 2 pi in eV s") # in eV s
+M2TOCM2 = 1e4 # Convert from m^2 to cm^2
+PREFACTOR = M2TOCM2/(2 * constants.epsilon_0 * constants.c**3 * HBAR**2) # energy and theta dependence added in shgyield
+
 
 def broad(data, sigma):
     ''' applies Gaussian broadening to real number '''
@@ -29,9 +35,10 @@ def broad(data, sigma):
 
 
 def broadC(data, sigma):
-    ''' applies Gaussian broadening to complex and returns complex '''
-    real = ndimage.filters.gaussian_filter(data.real, sigma)
-    imag = ndimage.filters.gaussian_filter(data.imag, sigma)
+    ''' applies Gaussian broadening along the last axis to complex and returns complex '''
+    sigmas = [0]*(np.ndim(data) - 1) + [sigma] # no broadening across stacked components
+    real = ndimage.filters.gaussian_filter(data.real, sigmas)
+    imag = ndimage.filters.gaussian_filter(data.imag, sigmas)
     return real + 1j*imag
 
 
@@ -47,11 +54,62 @@ def splineC(data, energy):
     return (real, imag)
 
 
-def splineEPS(data, energy):
+_STACKS = collections.OrderedDict() # LRU of at most STACKS_MAX entries
+STACKS_MAX = 16
+
+def stackC(data, sigma):
+    '''
+    Stacks the complex components of data that share an energy grid into a
+    single (n, N) array, broadens it, and fits one spline to all of them.
+    Cached per input contents and sigma, keeping the most recent STACKS_MAX.
+    '''
+    ## fingerprint the contents, so arrays edited in place are never served stale
+    key = (tuple((name, val['data'].shape, hash(val['data'].tobytes()), hash(val['energy'].tobytes()))
+                 for name, val in data.items()), sigma)
+    if key in _STACKS:
+        _STACKS.move_to_end(key)
+        return _STACKS[key]
+    groups = []
+    for name, val in data.items():
+        for group in groups:
+            if np.array_equal(group['energy'], val['energy']):
+                group['keys'].append(name)
+                group['data'].append(val['data'])
+                break
+        else:
+            groups.append({'energy': val['energy'], 'keys': [name], 'data': [val['data']]})
+    for group in groups:
+        group['data'] = broadC(np.stack(group['data']), sigma)
+        ## (re, im) of every component as the columns of one real spline
+        group['spline'] = make_interp_spline(group['energy'],
+                                             np.ascontiguousarray(group['data'].T).view(np.float64),
+                                             k=3)
+    _STACKS[key] = groups
+    _STACKS.move_to_end(key)
+    while len(_STACKS) > STACKS_MAX:
+        _STACKS.popitem(last=False)
+    return groups
+
+
+def splineS(data, energy, sigma):
+    ''' evaluates the broadened components of data at energy, returns a dict '''
+    new = {}
+    for group in stackC(data, sigma):
+        grid = group['energy']
+        if np.shape(energy) == np.shape(grid) and np.array_equal(energy, grid):
+            new.update(zip(group['keys'], group['data']))
+            continue
+        if np.min(energy) < grid[0] or np.max(energy) > grid[-1]:
+            raise ValueError("x value out of bounds") # as InterpolatedUnivariateSpline(ext=2)
+        vals = np.ascontiguousarray(group['spline'](energy)).view(np.complex128)
+        new.update(zip(group['keys'], vals.T))
+    return new
+
+
+def splineEPS(data, energy, sigma):
     ''' IMPROVE: creates a spline for EPS, returns 1w and 2w '''
-    splines = {key: splineC(val['data'], val['energy']) for key, val in data.items()}
-    new1w = {key: val[0](energy) + 1j*val[1](energy) for key, val in splines.items()}
-    new2w = {key: val[0](2*energy) + 1j*val[1](2*energy) for key, val in splines.items()}
+    new1w = splineS(data, energy, sigma)
+    new2w = splineS(data, 2*energy, sigma)
     return (new1w, new2w)
 
 
@@ -63,72 +121,74 @@ def avgEPS(data):
 def rotate(chi2, rotang):
     ## in-plane rotatation for chi2 tensor components
     gamma = np.radians(90) - rotang
+    sg = np.sin(gamma)
+    cg = np.cos(gamma)
     chi2rot = {
-        'xxx' : + np.sin(gamma)**3*chi2['xxx'] \
-                + np.sin(gamma)*np.cos(gamma)**2*chi2['xyy'] \
-                - 2*np.sin(gamma)**2*np.cos(gamma)*chi2['xxy'] \
-                - np.sin(gamma)**2*np.cos(gamma)*chi2['yxx'] \
-                - np.cos(gamma)**3*chi2['yyy'] \
-                + 2*np.sin(gamma)*np.cos(gamma)**2*chi2['yxy'],
-        'xyy' : + np.sin(gamma)*np.cos(gamma)**2*chi2['xxx'] \
-                + np.sin(gamma)**3*chi2['xyy'] \
-                + 2*np.sin(gamma)**2*np.cos(gamma)*chi2['xxy'] \
-                - np.cos(gamma)**3*chi2['yxx'] \
-                - np.sin(gamma)**2*np.cos(gamma)*chi2['yyy'] \
-                - 2*np.sin(gamma)*np.cos(gamma)**2*chi2['yxy'],
-        'xzz' : + np.sin(gamma)*chi2['xzz'] - np.cos(gamma)*chi2['yzz'],
-        'xyz' : + np.sin(gamma)**2*chi2['xyz'] \
-                + np.sin(gamma)*np.cos(gamma)*chi2['xxz'] \
-                - np.sin(gamma)*np.cos(gamma)*chi2['yyz'] \
-                - np.cos(gamma)**2*chi2['yxz'],
-        'xxz' : - np.sin(gamma)*np.cos(gamma)*chi2['xyz'] \
-                + np.sin(gamma)**2*chi2['xxz'] \
-                + np.cos(gamma)**2*chi2['yyz'] \
-                - np.sin(gamma)*np.cos(gamma)*chi2['yxz'],
-        'xxy' : + np.sin(gamma)**2*np.cos(gamma)*chi2['xxx'] \
-                - np.sin(gamma)**2*np.cos(gamma)*chi2['xyy'] \
-                + (np.sin(gamma)**3 - np.sin(gamma)*np.cos(gamma)**2)*chi2['xxy'] \
-                - np.sin(gamma)*np.cos(gamma)**2*chi2['yxx'] \
-                - np.sin(gamma)*np.cos(gamma)**2*chi2['yyy'] \
-                + (np.cos(gamma)**3 - np.sin(gamma)**2*np.cos(gamma))*chi2['yxy'],
-        'yxx' : + np.sin(gamma)**2*np.cos(gamma)*chi2['xxx'] \
-                + np.cos(gamma)**3*chi2['xyy'] \
-                - 2*np.sin(gamma)*np.cos(gamma)**2*chi2['xxy'] \
-                + np.sin(gamma)**3*chi2['yxx'] \
-                + np.sin(gamma)*np.cos(gamma)**2*chi2['yyy'] \
-                - 2*np.sin(gamma)**2*np.cos(gamma)*chi2['yxy'],
-        'yyy' : + np.cos(gamma)**3*chi2['xxx'] \
-                + np.sin(gamma)**2*np.cos(gamma)*chi2['xyy'] \
-                + 2*np.sin(gamma)*np.cos(gamma)**2*chi2['xxy'] \
-                + np.sin(gamma)*np.cos(gamma)**2*chi2['yxx'] \
-                + np.sin(gamma)**3*chi2['yyy'] \
-                + 2*np.sin(gamma)**2*np.cos(gamma)*chi2['yxy'],
-        'yzz' : + np.cos(gamma)*chi2['xzz'] + np.sin(gamma)*chi2['yzz'],
-        'yyz' : + np.sin(gamma)*np.cos(gamma)*chi2['xyz'] \
-                + np.cos(gamma)**2*chi2['xxz'] \
-                + np.sin(gamma)**2*chi2['yyz'] \
-                + np.sin(gamma)*np.cos(gamma)*chi2['yxz'],
-        'yxz' : - np.cos(gamma)**2*chi2['xyz'] \
-                + np.sin(gamma)*np.cos(gamma)*chi2['xxz'] \
-                - np.sin(gamma)*np.cos(gamma)*chi2['yyz'] \
-                + np.sin(gamma)**2*chi2['yxz'],
-        'yxy' : + np.sin(gamma)*np.cos(gamma)**2*chi2['xxx'] \
-                - np.sin(gamma)*np.cos(gamma)**2*chi2['xyy'] \
-                - (np.cos(gamma)**3 - np.sin(gamma)**2*np.cos(gamma))*chi2['xxy'] \
-                + np.sin(gamma)**2*np.cos(gamma)*chi2['yxx'] \
-                - np.sin(gamma)**2*np.cos(gamma)*chi2['yyy'] \
-                + (np.sin(gamma)**3 - np.sin(gamma)*np.cos(gamma)**2)*chi2['yxy'],
-        'zxx' : + np.sin(gamma)**2*chi2['zxx'] \
-                + np.cos(gamma)**2*chi2['zyy'] \
-                - 2*np.sin(gamma)*np.cos(gamma)*chi2['zxy'],
-        'zyy' : + np.cos(gamma)**2*chi2['zxx'] \
-                + np.sin(gamma)**2*chi2['zyy'] \
-                + 2*np.sin(gamma)*np.cos(gamma)*chi2['zxy'],
+        'xxx' : + sg**3*chi2['xxx'] \
+                + sg*cg**2*chi2['xyy'] \
+                - 2*sg**2*cg*chi2['xxy'] \
+                - sg**2*cg*chi2['yxx'] \
+                - cg**3*chi2['yyy'] \
+                + 2*sg*cg**2*chi2['yxy'],
+        'xyy' : + sg*cg**2*chi2['xxx'] \
+                + sg**3*chi2['xyy'] \
+                + 2*sg**2*cg*chi2['xxy'] \
+                - cg**3*chi2['yxx'] \
+                - sg**2*cg*chi2['yyy'] \
+                - 2*sg*cg**2*chi2['yxy'],
+        'xzz' : + sg*chi2['xzz'] - cg*chi2['yzz'],
+        'xyz' : + sg**2*chi2['xyz'] \
+                + sg*cg*chi2['xxz'] \
+                - sg*cg*chi2['yyz'] \
+                - cg**2*chi2['yxz'],
+        'xxz' : - sg*cg*chi2['xyz'] \
+                + sg**2*chi2['xxz'] \
+                + cg**2*chi2['yyz'] \
+                - sg*cg*chi2['yxz'],
+        'xxy' : + sg**2*cg*chi2['xxx'] \
+                - sg**2*cg*chi2['xyy'] \
+                + (sg**3 - sg*cg**2)*chi2['xxy'] \
+                - sg*cg**2*chi2['yxx'] \
+                - sg*cg**2*chi2['yyy'] \
+                + (cg**3 - sg**2*cg)*chi2['yxy'],
+        'yxx' : + sg**2*cg*chi2['xxx'] \
+                + cg**3*chi2['xyy'] \
+                - 2*sg*cg**2*chi2['xxy'] \
+                + sg**3*chi2['yxx'] \
+                + sg*cg**2*chi2['yyy'] \
+                - 2*sg**2*cg*chi2['yxy'],
+        'yyy' : + cg**3*chi2['xxx'] \
+                + sg**2*cg*chi2['xyy'] \
+                + 2*sg*cg**2*chi2['xxy'] \
+                + sg*cg**2*chi2['yxx'] \
+                + sg**3*chi2['yyy'] \
+                + 2*sg**2*cg*chi2['yxy'],
+        'yzz' : + cg*chi2['xzz'] + sg*chi2['yzz'],
+        'yyz' : + sg*cg*chi2['xyz'] \
+                + cg**2*chi2['xxz'] \
+                + sg**2*chi2['yyz'] \
+                + sg*cg*chi2['yxz'],
+        'yxz' : - cg**2*chi2['xyz'] \
+                + sg*cg*chi2['xxz'] \
+                - sg*cg*chi2['yyz'] \
+                + sg**2*chi2['yxz'],
+        'yxy' : + sg*cg**2*chi2['xxx'] \
+                - sg*cg**2*chi2['xyy'] \
+                - (cg**3 - sg**2*cg)*chi2['xxy'] \
+                + sg**2*cg*chi2['yxx'] \
+                - sg**2*cg*chi2['yyy'] \
+                + (sg**3 - sg*cg**2)*chi2['yxy'],
+        'zxx' : + sg**2*chi2['zxx'] \
+                + cg**2*chi2['zyy'] \
+                - 2*sg*cg*chi2['zxy'],
+        'zyy' : + cg**2*chi2['zxx'] \
+                + sg**2*chi2['zyy'] \
+                + 2*sg*cg*chi2['zxy'],
         'zzz' : + chi2['zzz'],
-        'zyz' : + np.sin(gamma)*chi2['zyz'] + np.cos(gamma)*chi2['zxz'],
-        'zxz' : - np.cos(gamma)*chi2['zyz'] + np.sin(gamma)*chi2['zxz'],
-        'zxy' : + np.sin(gamma)*np.cos(gamma)*chi2['zxx'] \
-                - np.sin(gamma)*np.cos(gamma)*chi2['zyy'] \
+        'zyz' : + sg*chi2['zyz'] + cg*chi2['zxz'],
+        'zxz' : - cg*chi2['zyz'] + sg*chi2['zxz'],
+        'zxy' : + sg*cg*chi2['zxx'] \
+                - sg*cg*chi2['zyy'] \
                 - np.cos(2*gamma)*chi2['zxy']
     }
     return chi2rot
@@ -177,8 +237,7 @@ def mrc2w(energy, eps0, fres1, fres2, theta, thick, mref):
     THICKNESS MUST BE IN NANOMETERS!!!
     '''
     if mref:
-        delta = 8*np.pi * ((energy * thick * 1e-9)/\
-                (constants.value("Planck constant in eV s") * constants.c)) * wvec(eps0, theta) 
+        delta = 8*np.pi * ((energy * thick * 1e-9)/HC) * wvec(eps0, theta)
         return (fres1 * np.exp(1j * (delta/2)))/\
                (1 + (fres2 * fres1 * np.exp(1j * delta))) * np.sinc(delta/2)
     elif not mref:
@@ -190,191 +249,167 @@ def mrc1w(energy, eps0, fres1, fres2, theta, thick, mref):
     1w multiple reflection coefficient, see Eq. (21) of PRB 94, 115314 (2016).
     '''
     if mref:
-        varphi = 4*np.pi * ((energy * thick * 1e-9)/\
-                 (constants.value("Planck constant in eV s") * constants.c)) * wvec(eps0, theta)
+        varphi = 4*np.pi * ((energy * thick * 1e-9)/HC) * wvec(eps0, theta)
         return (fres1 * np.exp(1j * varphi))/\
                (1 + (fres2 * fres1 * np.exp(1j * varphi)))
     elif not mref:
         return fres1
 
 
-def rad_pp(energy, eps1w, eps2w, chi2, theta, phi, thick, mref):
+def factors(energy, eps1w, eps2w, theta, thick, mref):
+    '''
+    Wave vectors, multiple reflection coefficients and transmission prefactors
+    for s and p polarizations at 1w and 2w, shared by the rad_* functions.
+    '''
+    fres = {'w1': wvec(eps1w['M2'], theta),
+            'w2': wvec(eps2w['M2'], theta),
+            'R1p': mrc1w(energy,
+                         eps1w['M2'],
+                         frefp(eps1w['M2'], eps1w['M3'], theta),
+                         frefp(eps1w['M1'], eps1w['M2'], theta),
+                         theta, thick, mref),
+            'R1s': mrc1w(energy,
+                         eps1w['M2'],
+                         frefs(eps1w['M2'], eps1w['M3'], theta),
+                         frefs(eps1w['M1'], eps1w['M2'], theta),
+                         theta, thick, mref),
+            'R2p': mrc2w(energy,
+                         eps2w['M2'],
+                         frefp(eps2w['M2'], eps2w['M3'], theta),
+                         frefp(eps2w['M1'], eps2w['M2'], theta),
+                         theta, thick, mref),
+            'R2s': mrc2w(energy,
+                         eps2w['M2'],
+                         frefs(eps2w['M2'], eps2w['M3'], theta),
+                         frefs(eps2w['M1'], eps2w['M2'], theta),
+                         theta, thick, mref)}
+    fres['T1p'] = ftranp(eps1w['M1'], eps1w['M2'], theta)/np.sqrt(eps1w['M2'])
+    fres['T1s'] = ftrans(eps1w['M1'], eps1w['M2'], theta) * (1 + fres['R1s'])
+    fres['T2p'] = ftranp(eps2w['M1'], eps2w['M2'], theta)/np.sqrt(eps2w['M2'])
+    fres['T2s'] = ftrans(eps2w['M1'], eps2w['M2'], theta) * (1 + fres['R2s'])
+    return fres
+
+
+def contract(coef, chi2):
+    '''
+    Sums coef*chi2 over the tensor components, skipping those that are
+    identically zero.
+    '''
+    return sum(coef[key] * chi2[key] for key in coef
+               if not (np.isscalar(chi2[key]) and chi2[key] == 0))
+
+
+def rad_pp(fres, chi2, theta, phi):
     '''
     rpP, see Eq. (50) of PRB 94, 115314 (2016).
     '''
-    fres2p = mrc2w(energy,
-                   eps2w['M2'],
-                   frefp(eps2w['M2'], eps2w['M3'], theta),
-                   frefp(eps2w['M1'], eps2w['M2'], theta),
-                   theta, thick, mref)
-    fres1p = mrc1w(energy,
-                   eps1w['M2'],
-                   frefp(eps1w['M2'], eps1w['M3'], theta),
-                   frefp(eps1w['M1'], eps1w['M2'], theta),
-                   theta, thick, mref)
-    pre = (ftranp(eps2w['M1'], eps2w['M2'], theta)/np.sqrt(eps2w['M2'])) * \
-          (ftranp(eps1w['M1'], eps1w['M2'], theta)/np.sqrt(eps1w['M2']))**2
+    sthe = np.sin(theta)
+    sphi = np.sin(phi)
+    cphi = np.cos(phi)
+    fres2p = fres['R2p']
+    fres1p = fres['R1p']
+    wv1w = fres['w1']
+    wv2w = fres['w2']
+    pre = fres['T2p'] * fres['T1p']**2
+    ## Fresnel and wave vector products shared between components
+    xyin = (1 - fres2p) * (1 - fres1p)**2 * wv1w**2 * wv2w
+    xzin = 2 * (1 - fres2p) * (1 + fres1p) * (1 - fres1p) * wv1w * wv2w
+    xzzz = (1 - fres2p) * (1 + fres1p)**2 * wv2w
+    zxyy = (1 + fres2p) * (1 - fres1p)**2 * wv1w**2
+    zxzz = 2 * (1 + fres2p) * (1 + fres1p) * (1 - fres1p) * wv1w
+    zzzz = (1 + fres2p) * (1 + fres1p)**2
     ### r_{pP}
-    rpp = - ((1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.cos(phi)**3 * chi2['xxx']) \
-          - (2 * (1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.sin(phi) * np.cos(phi)**2 * chi2['xxy']) \
-          - (2 * (1 - fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) * wvec(eps2w['M2'], theta) \
-            * np.sin(theta) * np.cos(phi)**2 * chi2['xxz']) \
-          - ((1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.sin(phi)**2 * np.cos(phi) * chi2['xyy']) \
-          - (2 * (1 - fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) * wvec(eps2w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi) * np.cos(phi) * chi2['xyz']) \
-          - ((1 - fres2p) * (1 + fres1p)**2 \
-            * wvec(eps2w['M2'], theta) \
-            * np.sin(theta)**2 * np.cos(phi) * chi2['xzz']) \
-          - ((1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.sin(phi) * np.cos(phi)**2 * chi2['yxx']) \
-          - (2 * (1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.sin(phi)**2 * np.cos(phi) * chi2['yxy']) \
-          - (2 * (1 - fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) * wvec(eps2w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi) * np.cos(phi) * chi2['yxz']) \
-          - ((1 - fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 * wvec(eps2w['M2'], theta) \
-            * np.sin(phi)**3 * chi2['yyy']) \
-          - (2 * (1 - fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) * wvec(eps2w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi)**2 * chi2['yyz']) \
-          - ((1 - fres2p) * (1 + fres1p)**2 \
-            * wvec(eps2w['M2'], theta) \
-            * np.sin(theta)**2 * np.sin(phi) * chi2['yzz']) \
-          + ((1 + fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(theta) * np.cos(phi)**2 * chi2['zxx']) \
-          + (2 * (1 + fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) \
-            * np.sin(theta)**2 * np.cos(phi) * chi2['zxz']) \
-          + (2 * (1 + fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(theta) * np.sin(phi) * np.cos(phi) * chi2['zxy']) \
-          + ((1 + fres2p) * (1 - fres1p)**2 \
-            * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(theta) * np.sin(phi)**2 * chi2['zyy']) \
-          + (2 * (1 + fres2p) * (1 + fres1p) * (1 - fres1p) \
-            * wvec(eps1w['M2'], theta) \
-            * np.sin(theta)**2 * np.sin(phi) * chi2['zyz']) \
-          + ((1 + fres2p) * (1 + fres1p)**2 * np.sin(phi)**3 * chi2['zzz'])
+    rpp = contract({'xxx': - xyin * cphi**3,
+                    'xxy': - xyin * 2 * sphi * cphi**2,
+                    'xyy': - xyin * sphi**2 * cphi,
+                    'yxx': - xyin * sphi * cphi**2,
+                    'yxy': - xyin * 2 * sphi**2 * cphi,
+                    'yyy': - xyin * sphi**3,
+                    'xxz': - xzin * sthe * cphi**2,
+                    'xyz': - xzin * sthe * sphi * cphi,
+                    'yxz': - xzin * sthe * sphi * cphi,
+                    'yyz': - xzin * sthe * sphi**2,
+                    'xzz': - xzzz * sthe**2 * cphi,
+                    'yzz': - xzzz * sthe**2 * sphi,
+                    'zxx': + zxyy * sthe * cphi**2,
+                    'zxy': + zxyy * sthe * 2 * sphi * cphi,
+                    'zyy': + zxyy * sthe * sphi**2,
+                    'zxz': + zxzz * sthe**2 * cphi,
+                    'zyz': + zxzz * sthe**2 * sphi,
+                    'zzz': + zzzz * sphi**3}, chi2)
     return pre*rpp
 
 
-def rad_ps(energy, eps1w, eps2w, chi2, theta, phi, thick, mref):
+def rad_ps(fres, chi2, theta, phi):
     '''
     rpS, see Eq. (55) of PRB 94, 115314 (2016).
     '''
-    fres2s = mrc2w(energy,
-                   eps2w['M2'],
-                   frefs(eps2w['M2'], eps2w['M3'], theta),
-                   frefs(eps2w['M1'], eps2w['M2'], theta),
-                   theta, thick, mref)
-    fres1p = mrc1w(energy,
-                   eps1w['M2'],
-                   frefp(eps1w['M2'], eps1w['M3'], theta),
-                   frefp(eps1w['M1'], eps1w['M2'], theta),
-                   theta, thick, mref)
-    pre = (ftrans(eps2w['M1'], eps2w['M2'], theta) * (1 + fres2s)) * \
-          (ftranp(eps1w['M1'], eps1w['M2'], theta)/np.sqrt(eps1w['M2']))**2
+    sthe = np.sin(theta)
+    sphi = np.sin(phi)
+    cphi = np.cos(phi)
+    fres1p = fres['R1p']
+    wv1w = fres['w1']
+    pre = fres['T2s'] * fres['T1p']**2
+    ## Fresnel and wave vector products shared between components
+    xyin = (1 - fres1p)**2 * wv1w**2
+    xzin = 2 * (1 + fres1p) * (1 - fres1p) * wv1w
+    zzin = (1 + fres1p)**2
     ### r_{pS}
-    rps = - ((1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(phi) * np.cos(phi)**2 * chi2['xxx']) \
-          - (2 * (1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(phi)**2 * np.cos(phi) * chi2['xxy']) \
-          - (2 * (1 + fres1p) * (1 - fres1p) * wvec(eps1w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi) * np.cos(phi) * chi2['xxz']) \
-          - ((1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(phi)**3 * chi2['xyy']) \
-          - (2 * (1 + fres1p) * (1 - fres1p) * wvec(eps1w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi)**2 * chi2['xyz']) \
-          - ((1 + fres1p)**2 \
-            * np.sin(theta)**2 * np.sin(phi) * chi2['xzz']) \
-          + ((1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.cos(phi)**3 * chi2['yxx']) \
-          + (2 * (1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(phi) * np.cos(phi)**2 * chi2['yxy']) \
-          + (2 * (1 + fres1p) * (1 - fres1p) * wvec(eps1w['M2'], theta) \
-            * np.sin(theta) * np.cos(phi)**2 * chi2['yxz']) \
-          + ((1 - fres1p)**2 * wvec(eps1w['M2'], theta)**2 \
-            * np.sin(phi)**2 * np.cos(phi) * chi2['yyy']) \
-          + (2 * (1 + fres1p) * (1 - fres1p) * wvec(eps1w['M2'], theta) \
-            * np.sin(theta) * np.sin(phi) * np.cos(phi) * chi2['yyz']) \
-          + ((1 + fres1p)**2 \
-            * np.sin(theta)**2 * np.cos(phi) * chi2['yzz'])
+    rps = contract({'xxx': - xyin * sphi * cphi**2,
+                    'xxy': - xyin * 2 * sphi**2 * cphi,
+                    'xyy': - xyin * sphi**3,
+                    'yxx': + xyin * cphi**3,
+                    'yxy': + xyin * 2 * sphi * cphi**2,
+                    'yyy': + xyin * sphi**2 * cphi,
+                    'xxz': - xzin * sthe * sphi * cphi,
+                    'xyz': - xzin * sthe * sphi**2,
+                    'yxz': + xzin * sthe * cphi**2,
+                    'yyz': + xzin * sthe * sphi * cphi,
+                    'xzz': - zzin * sthe**2 * sphi,
+                    'yzz': + zzin * sthe**2 * cphi}, chi2)
     return pre*rps
 
 
-def rad_sp(energy, eps1w, eps2w, chi2, theta, phi, thick, mref):
+def rad_sp(fres, chi2, theta, phi):
     '''
     rsP, see Eq. (60) of PRB 94, 115314 (2016).
     '''
-    fres2p = mrc2w(energy,
-                   eps2w['M2'],
-                   frefp(eps2w['M2'], eps2w['M3'], theta),
-                   frefp(eps2w['M1'], eps2w['M2'], theta),
-                   theta, thick, mref)
-    fres1s = mrc1w(energy,
-                   eps1w['M2'],
-                   frefs(eps1w['M2'], eps1w['M3'], theta),
-                   frefs(eps1w['M1'], eps1w['M2'], theta),
-                   theta, thick, mref)
-    pre = (ftranp(eps2w['M1'], eps2w['M2'], theta)/np.sqrt(eps2w['M2'])) * \
-          (ftrans(eps1w['M1'], eps1w['M2'], theta) * (1 + fres1s))**2
+    sthe = np.sin(theta)
+    sphi = np.sin(phi)
+    cphi = np.cos(phi)
+    fres2p = fres['R2p']
+    wv2w = fres['w2']
+    pre = fres['T2p'] * fres['T1s']**2
+    ## Fresnel and wave vector products shared between components
+    xout = (1 - fres2p) * wv2w
+    zout = (1 + fres2p) * sthe
     ### r_{sP}
-    rsp = - ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * np.sin(phi)**2 * np.cos(phi) * chi2['xxx']) \
-          + ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * 2 * np.sin(phi) * np.cos(phi)**2 * chi2['xxy']) \
-          - ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * np.cos(phi)**3 * chi2['xyy']) \
-          - ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * np.sin(phi)**3 * chi2['yxx']) \
-          + ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * 2 * np.sin(phi)**2 * np.cos(phi) * chi2['yxy']) \
-          - ((1 - fres2p) * wvec(eps2w['M2'], theta) \
-            * np.sin(phi) * np.cos(phi)**2 * chi2['yyy']) \
-          + ((1 + fres2p) \
-            * np.sin(theta) * np.sin(phi)**2 * chi2['zxx']) \
-          - ((1 + fres2p) \
-            * np.sin(theta) * 2 * np.sin(phi) * np.cos(phi) * chi2['zxy']) \
-          + ((1 + fres2p) \
-            * np.sin(theta) * np.cos(phi)**2 * chi2['zyy'])
+    rsp = contract({'xxx': - xout * sphi**2 * cphi,
+                    'xxy': + xout * 2 * sphi * cphi**2,
+                    'xyy': - xout * cphi**3,
+                    'yxx': - xout * sphi**3,
+                    'yxy': + xout * 2 * sphi**2 * cphi,
+                    'yyy': - xout * sphi * cphi**2,
+                    'zxx': + zout * sphi**2,
+                    'zxy': - zout * 2 * sphi * cphi,
+                    'zyy': + zout * cphi**2}, chi2)
     return pre*rsp
 
 
-def rad_ss(energy, eps1w, eps2w, chi2, theta, phi, thick, mref):
+def rad_ss(fres, chi2, theta, phi):
     '''
     rsS, see Eq. (65) of PRB 94, 115314 (2016).
     '''
-    fres2s = mrc2w(energy,
-                   eps2w['M2'],
-                   frefs(eps2w['M2'], eps2w['M3'], theta),
-                   frefs(eps2w['M1'], eps2w['M2'], theta),
-                   theta, thick, mref)
-    fres1s = mrc1w(energy,
-                   eps1w['M2'],
-                   frefs(eps1w['M2'], eps1w['M3'], theta),
-                   frefs(eps1w['M1'], eps1w['M2'], theta),
-                   theta, thick, mref)
-    pre = (ftrans(eps2w['M1'], eps2w['M2'], theta) * (1 + fres2s)) * \
-          (ftrans(eps1w['M1'], eps1w['M2'], theta) * (1 + fres1s))**2
+    sphi = np.sin(phi)
+    cphi = np.cos(phi)
+    pre = fres['T2s'] * fres['T1s']**2
     ### r_{sS}
-    rss = - (np.sin(phi)**3 * chi2['xxx']) \
-          + (2 * np.sin(phi)**2 * np.cos(phi) * chi2['xxy']) \
-          - (np.sin(phi) * np.cos(phi)**2 * chi2['xyy']) \
-          + (np.sin(phi)**2 * np.cos(phi) * chi2['yxx']) \
-          + (np.cos(phi)**3 * chi2['yyy']) \
-          - (2 * np.sin(phi) * np.cos(phi)**2 * chi2['yxy'])
+    rss = contract({'xxx': - sphi**3,
+                    'xxy': + 2 * sphi**2 * cphi,
+                    'xyy': - sphi * cphi**2,
+                    'yxx': + sphi**2 * cphi,
+                    'yyy': + cphi**3,
+                    'yxy': - 2 * sphi * cphi**2}, chi2)
     return pre*rss
 
 
@@ -385,20 +420,20 @@ def shgyield(energy, eps_m1, eps_m2, eps_m3, chi2, theta, phi, thick, gamma=90,
     '''
 
     eps_m1_num = {key: val for key, val in eps_m1.items() if not isinstance(val, dict)}
-    eps_m1_brd = {key: {'energy': val['energy'], 'data': broadC(val['data'], sigma_eps)} for key, val in eps_m1.items() if isinstance(val, dict)}
-    eps_m1_spl = splineEPS(eps_m1_brd, energy)
+    eps_m1_arr = {key: val for key, val in eps_m1.items() if isinstance(val, dict)}
+    eps_m1_spl = splineEPS(eps_m1_arr, energy, sigma_eps)
     eps_m1_spl[0].update(eps_m1_num)
     eps_m1_spl[1].update(eps_m1_num)
 
     eps_m2_num = {key: val for key, val in eps_m2.items() if not isinstance(val, dict)}
-    eps_m2_brd = {key: {'energy': val['energy'], 'data': broadC(val['data'], sigma_eps)} for key, val in eps_m2.items() if isinstance(val, dict)}
-    eps_m2_spl = splineEPS(eps_m2_brd, energy)
+    eps_m2_arr = {key: val for key, val in eps_m2.items() if isinstance(val, dict)}
+    eps_m2_spl = splineEPS(eps_m2_arr, energy, sigma_eps)
     eps_m2_spl[0].update(eps_m2_num)
     eps_m2_spl[1].update(eps_m2_num)
     
     eps_m3_num = {key: val for key, val in eps_m3.items() if not isinstance(val, dict)}
-    eps_m3_brd = {key: {'energy': val['energy'], 'data': broadC(val['data'], sigma_eps)} for key, val in eps_m3.items() if isinstance(val, dict)}
-    eps_m3_spl = splineEPS(eps_m3_brd, energy)
+    eps_m3_arr = {key: val for key, val in eps_m3.items() if isinstance(val, dict)}
+    eps_m3_spl = splineEPS(eps_m3_arr, energy, sigma_eps)
     eps_m3_spl[0].update(eps_m3_num)
     eps_m3_spl[1].update(eps_m3_num)
 
@@ -420,18 +455,24 @@ def shgyield(energy, eps_m1, eps_m2, eps_m3, chi2, theta, phi, thick, gamma=90,
                  'M3' : avgEPS(eps_m3_spl[1])}
 
     chi2_num = {key: val for key, val in chi2.items() if not isinstance(val, dict)}
-    chi2_spl = {key: splineC(broadC(val['data'], sigma_chi), val['energy']) for key, val in chi2.items() if isinstance(val, dict)}
-    chi2_new = {key: val[0](energy) + 1j*val[1](energy) for key, val in chi2_spl.items()}
+    chi2_new = splineS({key: val for key, val in chi2.items() if isinstance(val, dict)}, energy, sigma_chi)
     chi2_new.update(chi2_num)
     chi2_rot = rotate(chi2_new, np.radians(gamma))
 
-    m2tocm2 = 1e4 # Convert from m^2 to cm^2
-    prefactor = m2tocm2 * ((energy/constants.value("Planck constant over 2 pi in eV s"))**2)/\
-                          (2 * constants.epsilon_0 * constants.c**3 * np.cos(np.radians(theta))**2)
+    trad = np.radians(theta)
+    prad = np.radians(phi)
+    prefactor = PREFACTOR * energy**2/np.cos(trad)**2
+    fres = factors(energy, eps1w, eps2w, trad, thick, mref)
+    norm = 1/np.sqrt(eps1w['M2'])
     dakkar = {'energy': energy,
               'phi': phi,
-              'pp': broad(prefactor * np.absolute(1/np.sqrt(eps1w['M2']) * rad_pp(energy, eps1w, eps2w, chi2_rot, np.radians(theta), np.radians(phi), thick, mref))**2, sigma_out),
-              'ps': broad(prefactor * np.absolute(1/np.sqrt(eps1w['M2']) * rad_ps(energy, eps1w, eps2w, chi2_rot, np.radians(theta), np.radians(phi), thick, mref))**2, sigma_out),
-              'sp': broad(prefactor * np.absolute(1/np.sqrt(eps1w['M2']) * rad_sp(energy, eps1w, eps2w, chi2_rot, np.radians(theta), np.radians(phi), thick, mref))**2, sigma_out),
-              'ss': broad(prefactor * np.absolute(1/np.sqrt(eps1w['M2']) * rad_ss(energy, eps1w, eps2w, chi2_rot, np.radians(theta), np.radians(phi), thick, mref))**2, sigma_out)}
+              'pp': broad(prefactor * np.absolute(norm * rad_pp(fres, chi2_rot, trad, prad))**2, sigma_out),
+              'ps': broad(prefactor * np.absolute(norm * rad_ps(fres, chi2_rot, trad, prad))**2, sigma_out),
+              'sp': broad(prefactor * np.absolute(norm * rad_sp(fres, chi2_rot, trad, prad))**2, sigma_out),
+              'ss': broad(prefactor * np.absolute(norm * rad_ss(fres, chi2_rot, trad, prad))**2, sigma_out)}
     return dakkar
+
+
+def savenpz(outfile, data):
+    ''' saves a shgyield result to a binary .npz file, one array per key '''
+    np.savez(outfile, **{key: np.asarray(val) for key, val in data.items()})
@@ -4,8 +4,14 @@ A test script that tests relevant functions and finally compares the numerical
 accuracy of the final calculation.
 """
 
+import os
+import sys
+
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import shgyield.shg as shg
+
 def read_eps(in_file):
     ''' Reads epsilon file, returns a complex numpy array '''
     data = np.loadtxt(in_file, unpack=True, skiprows=1)
@@ -107,6 +113,79 @@ def test_shgyield():
           np.absolute((1/np.sqrt(EPS['l1w'])) * gamma * factor)**2
     np.testing.assert_allclose(rss, REFERENCE, rtol=1e-06, atol=1e-12)
 
+def read_spline(in_file):
+    ''' Reads epsilon or chi2 file, returns the dictionary used by shg.shgyield '''
+    data = np.loadtxt(in_file, unpack=True, skiprows=1)
+    return {'energy': data[0], 'data': data[1] + (1j * data[2])}
+
+def test_shgyield_module():
+    '''
+    Runs shg.shgyield for a spectrum (3-layer) and a polar sweep (fresnel),
+    compares all four polarizations against reference data, then returns both
+    '''
+    epsl = read_spline('tests/data/SiH1x1-epsilon')
+    epsb = read_spline('tests/data/SiBulk-epsilon')
+    xxx = read_spline('tests/data/SiH1x1-chi2-xxx')
+    chi2 = {key: 0 for key in ['xxy', 'xxz', 'xyz', 'xzz', 'yxx', 'yyy', 'yyz', 'yzz',
+                               'yxz', 'zxx', 'zyy', 'zzz', 'zxz', 'zyz', 'zxy']}
+    chi2['xxx'] = xxx
+    chi2['xyy'] = {'energy': xxx['energy'], 'data': -1 * xxx['data']}
+    chi2['yxy'] = {'energy': xxx['energy'], 'data': -1 * xxx['data']}
+    params = {'eps_m1': {'xx': 1.0, 'yy': 1.0, 'zz': 1.0},
+              'eps_m2': {'xx': epsl, 'yy': epsl, 'zz': epsl},
+              'eps_m3': {'xx': epsb, 'yy': epsb, 'zz': epsb},
+              'chi2': chi2, 'theta': 65, 'thick': 10}
+    spect = shg.shgyield(energy=np.linspace(0.5, 2.5, 9), phi=15, gamma=10,
+                         sigma_eps=1, sigma_chi=2, sigma_out=1, **params)
+    polar = shg.shgyield(energy=1.5, phi=np.arange(0, 361, 45), gamma=0,
+                         sigma_out=0, mode='fresnel', **params)
+    for pol in ['pp', 'sp', 'ps', 'ss']:
+        np.testing.assert_allclose(spect[pol], SPECT_REFERENCE[pol], rtol=1e-06,
+                                   atol=1e-12 * SPECT_REFERENCE[pol].max())
+        np.testing.assert_allclose(polar[pol], POLAR_REFERENCE[pol], rtol=1e-06,
+                                   atol=1e-12 * POLAR_REFERENCE[pol].max())
+    return spect, polar
+
+def test_savenpz(tmp_path):
+    ''' Saves shg.shgyield results with shg.savenpz and checks they load back unchanged '''
+    for result in test_shgyield_module():
+        outfile = str(tmp_path / 'result.npz')
+        shg.savenpz(outfile, result)
+        with np.load(outfile) as saved:
+            assert sorted(saved.files) == sorted(result.keys())
+            for key, val in result.items():
+                np.testing.assert_array_equal(saved[key], val)
+
+def test_loadcached(tmp_path, monkeypatch):
+    '''
+    Checks that main.loadcached writes the .npy copy, reads it back, refreshes
+    it when the text file changes, and recovers from a damaged copy
+    '''
+    import main
+    infile = str(tmp_path / 'data.dat')
+    cache = infile + '.npy'
+    np.savetxt(infile, np.arange(6.0).reshape(3, 2))
+    first = main.loadcached(infile) # parses the text file, writes the copy
+    assert os.path.exists(cache)
+    np.testing.assert_array_equal(np.load(cache), first)
+    np.testing.assert_array_equal(main.loadcached(infile), first) # read from the copy
+    np.savetxt(infile, 2 * np.arange(6.0).reshape(3, 2))
+    os.utime(infile, (os.path.getmtime(cache) + 10,) * 2) # newer text file
+    np.testing.assert_array_equal(main.loadcached(infile), 2 * first)
+    np.testing.assert_array_equal(np.load(cache), 2 * first)
+    os.utime(infile, (os.path.getmtime(cache) - 10,) * 2) # copy is current again
+    for damaged in [b'', b'\x93NUMPY garbage']:
+        with open(cache, 'wb') as out:
+            out.write(damaged)
+        np.testing.assert_array_equal(main.loadcached(infile), 2 * first)
+        np.testing.assert_array_equal(np.load(cache), 2 * first)
+    def full_disk(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    os.remove(cache)
+    monkeypatch.setattr(np, 'save', full_disk)
+    np.testing.assert_array_equal(main.loadcached(infile), 2 * first) # copy cannot be written
+    assert sorted(os.listdir(str(tmp_path))) == ['data.dat'] # no stray temporary files
+
 
 ONEE = np.linspace(0.01, float(100)/100, 100) # 1w energy array, 0.01-10 eV
 EPS = test_epsilon() # Creates the dictionary with the epsilons
@@ -147,3 +226,39 @@ REFERENCE = np.array( # An array with valid reference data, for numerical compar
      2.212026799999379642e-04, 2.346155505875994411e-04, 2.488391475834370015e-04,
      2.639239115208671417e-04, 2.799332689218986974e-04, 2.969349401098667443e-04,
      3.150020689590089578e-04])
+SPECT_REFERENCE = { # shg.shgyield spectra, see test_shgyield_module
+    'pp': np.array([
+     3.354963916262559683e-24, 1.724962236004079708e-23, 1.009489971438594196e-22,
+     4.359776512773318254e-22, 1.166354188629470660e-21, 1.978581712935067853e-21,
+     2.395180684139338837e-21, 2.206654549638311536e-21, 1.622325013350879543e-21]),
+    'sp': np.array([
+     1.050045245785018712e-24, 5.255693671374565280e-24, 3.001108870332406847e-23,
+     1.271348490204216444e-22, 3.332917088883043141e-22, 5.503152976697327517e-22,
+     6.418660152346245358e-22, 5.684734779708832184e-22, 4.036585990517314965e-22]),
+    'ps': np.array([
+     1.266585586655015207e-25, 6.051590814267234183e-25, 3.272795249164355675e-24,
+     1.319116470462872456e-23, 3.303449865600202029e-23, 5.265100504482325809e-23,
+     5.948427397396280043e-23, 5.156105080887191520e-23, 3.779658143073420494e-23]),
+    'ss': np.array([
+     3.968455182947105221e-26, 1.847813739238562214e-25, 9.752561719743981077e-25,
+     3.856195914077076683e-24, 9.464736166787765363e-24, 1.468829661520899583e-23,
+     1.600517754023302045e-23, 1.331036524236274908e-23, 9.382747169321237289e-24])
+}
+POLAR_REFERENCE = { # shg.shgyield polar sweeps, see test_shgyield_module
+    'pp': np.array([
+     3.986797530613916585e-22, 1.993398765306955941e-22, 5.381314738227322653e-53,
+     1.993398765306959938e-22, 3.986797530613916585e-22, 1.993398765306955941e-22,
+     2.152525895290929061e-52, 1.993398765306960408e-22, 3.986797530613916585e-22]),
+    'sp': np.array([
+     7.226022671778315376e-23, 3.613011335889154162e-23, 9.753568372562311789e-54,
+     3.613011335889161802e-23, 7.226022671778315376e-23, 3.613011335889154162e-23,
+     3.901427349024924716e-53, 3.613011335889162978e-23, 7.226022671778315376e-23]),
+    'ps': np.array([
+     4.740143982327926866e-54, 7.023560316683754203e-23, 1.404712063336749195e-22,
+     7.023560316683742448e-23, 4.266129584095135744e-53, 7.023560316683755378e-23,
+     1.404712063336749195e-22, 7.023560316683733044e-23, 1.185035995581981595e-52]),
+    'ss': np.array([
+     8.591454073294945680e-55, 1.273011877208222708e-23, 2.546023754416443359e-23,
+     1.273011877208220357e-23, 7.732308665965450243e-54, 1.273011877208223149e-23,
+     2.546023754416443359e-23, 1.273011877208219476e-23, 2.147863518323735869e-53])
+}